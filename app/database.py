@@ -1,10 +1,9 @@
 # app/database.py
 
+import asyncio
 import os
-import time
 from dotenv import load_dotenv
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.exc import OperationalError
 
 # Pick env file by APP_ENV (default: dev)
@@ -17,30 +16,49 @@ envfile = {
 load_dotenv(envfile, override=True)
 
 # Configuration values
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./app.db")
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite+aiosqlite:///./app.db")
 SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
 RETRIES = int(os.getenv("DB_RETRIES", "10"))
 DELAY = float(os.getenv("DB_RETRY_DELAY", "1.5"))
 
-# SQLite requires special connect args
-connect_args = {"check_same_thread": False} if DATABASE_URL.startswith("sqlite") else {}
-
-# Retry logic for establishing DB connection
-for _ in range(RETRIES):
-    try:
-        engine = create_engine(
-            DATABASE_URL,
-            pool_pre_ping=True,
-            echo=SQL_ECHO,
-            connect_args=connect_args,
-        )
-        with engine.connect():
-            pass
-        break
-    except OperationalError:
-        time.sleep(DELAY)
-
-SessionLocal = sessionmaker(
+# Connection pool sizing (per worker process).
+# Keep DB_POOL_SIZE + DB_POOL_MAX_OVERFLOW times the number of workers
+# below the Postgres max_connections setting.
+POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))
+POOL_MAX_OVERFLOW = int(os.getenv("DB_POOL_MAX_OVERFLOW", "40"))
+POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "3600"))
+POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+
+# How many compiled SQL statements the engine keeps, so the same
+# query shape is only turned into SQL once (SQLAlchemy default: 500)
+QUERY_CACHE_SIZE = int(os.getenv("DB_QUERY_CACHE_SIZE", "2000"))
+
+# SQLAlchemy's asyncpg adapter keeps the statements it prepares on each
+# connection, so Postgres parses and plans each query shape only once per connection
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "500"))
+connect_args = {
+    "prepared_statement_cache_size": STATEMENT_CACHE_SIZE,
+} if DATABASE_URL.startswith("postgresql+asyncpg") else {}
+
+# SQLite uses its own pool classes, so only size the pool for real servers
+pool_args = {} if DATABASE_URL.startswith("sqlite") else {
+    "pool_size": POOL_SIZE,
+    "max_overflow": POOL_MAX_OVERFLOW,
+    "pool_recycle": POOL_RECYCLE,
+    "pool_timeout": POOL_TIMEOUT,
+}
+
+# Async engine: DB calls suspend the request instead of blocking a thread
+engine = create_async_engine(
+    DATABASE_URL,
+    pool_pre_ping=True,
+    echo=SQL_ECHO,
+    query_cache_size=QUERY_CACHE_SIZE,
+    connect_args=connect_args,
+    **pool_args,
+)
+
+SessionLocal = async_sessionmaker(
     bind=engine,
     autocommit=False,
     autoflush=False,
@@ -48,9 +66,18 @@ SessionLocal = sessionmaker(
 )
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def wait_for_db():
+    # Retry logic for establishing DB connection
+    # (asyncpg raises OSError when the server is not up yet)
+    for _ in range(RETRIES):
+        try:
+            async with engine.connect():
+                pass
+            return
+        except (OperationalError, OSError):
+            await asyncio.sleep(DELAY)
+
+
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
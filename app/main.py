@@ -1,29 +1,100 @@
 # app/main.py
 
+import asyncio
+from collections import OrderedDict
 from contextlib import asynccontextmanager
+import hashlib  # hash response bodies for ETags
 import os  # read environment variables
 import httpx  # used to call other microservices over HTTP
 
-from fastapi import FastAPI, Depends, HTTPException, status, Response
+from fastapi import FastAPI, Depends, HTTPException, Query, status, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy import select
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+from fastapi_cache.decorator import cache
+from sqlalchemy import delete, insert, select, update
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from .database import engine, get_db
+from .database import engine, get_db, wait_for_db
 from .models import Base, UserDB
 from .schemas import UserInput, UserOutput, UserUpdate
 
+# Read endpoints are cached in memory for a short time.
+# Any write to users clears the "users" namespace.
+# The cache lives in each worker process, so with several workers a write only
+# clears its own worker's copy; the others can be stale for CACHE_EXPIRE_SECONDS.
+CACHE_EXPIRE_SECONDS = int(os.getenv("CACHE_EXPIRE_SECONDS", "30"))
+CACHE_MAX_SIZE = int(os.getenv("CACHE_MAX_SIZE", "1024"))
+USERS_CACHE_NAMESPACE = "users"
+
+
+class BoundedInMemoryBackend(InMemoryBackend):
+    # InMemoryBackend that keeps at most max_size keys.
+    # The plain one only drops an expired key when that key is read again,
+    # so here the least recently used key is dropped once the cache is full.
+    def __init__(self, max_size: int = CACHE_MAX_SIZE):
+        self._store = OrderedDict()
+        self.max_size = max_size
+
+    def _get(self, key):
+        value = super()._get(key)
+        if value:
+            self._store.move_to_end(key)
+        return value
+
+    async def set(self, key, value, expire=None):
+        await super().set(key, value, expire)
+        self._store.move_to_end(key)
+        while len(self._store) > self.max_size:
+            self._store.popitem(last=False)
+
+
+def cache_key_builder(func, namespace="", *, request=None, response=None, args=(), kwargs=None):
+    # Build the cache key from the endpoint's validated arguments
+    # (e.g. user_id, limit, offset), so unknown query params are ignored.
+    # The DB session is left out because it is new on every request.
+    params = sorted((name, value) for name, value in kwargs.items() if name != "db")
+    return f"{namespace}:{func.__name__}:{params}"
+
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # This runs once when the service starts
-    # It creates the users table if it does not exist yet
-    Base.metadata.create_all(bind=engine)
+    # It waits for the DB, then creates the users table if it does not exist yet
+    await wait_for_db()
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    FastAPICache.init(BoundedInMemoryBackend(), prefix="fit", key_builder=cache_key_builder)
+
+    # One shared async HTTP client for calling other services.
+    # Reusing it keeps connections open instead of reconnecting on every request,
+    # and being async means waiting on another service never blocks a thread.
+    # With HTTP/2 (over https) requests to a service share one connection.
+    # Short timeouts stop one slow service from holding up our requests,
+    # and a failed connection attempt is retried once.
+    transport = httpx.AsyncHTTPTransport(
+        http2=True,
+        retries=1,
+        limits=httpx.Limits(max_keepalive_connections=20, max_connections=100),
+    )
+    app.state.ahttp = httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(connect=0.5, read=1.5, write=0.5, pool=0.5),
+    )
     yield  # after this line, FastAPI starts serving requests
 
+    # This runs once when the service shuts down
+    await app.state.ahttp.aclose()
+    await engine.dispose()
+
 
 # Create the FastAPI app and attach the lifespan 
-app = FastAPI(lifespan=lifespan)
+# ORJSONResponse uses orjson (written in Rust) to turn responses into JSON
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 app.add_middleware(
     CORSMiddleware,
@@ -32,21 +103,119 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+# Headers that a 304 Not Modified has to send again (RFC 9110, section 15.4.5)
+NOT_MODIFIED_HEADERS = {b"cache-control", b"content-location", b"date", b"expires", b"vary"}
+
+
+@app.middleware("http")
+async def etag_middleware(request: Request, call_next):
+    # Adds an ETag to successful GET responses.
+    # If the client sends back the same ETag (If-None-Match), it already has
+    # this version, so we reply 304 Not Modified with no body.
+    response = await call_next(request)
+    if request.method != "GET" or response.status_code != status.HTTP_200_OK:
+        return response
+
+    # Read the body once so we can hash it.
+    # The ETag is weak (W/): it is taken from the uncompressed body, so the
+    # gzip and plain versions of a response share it, which a strong ETag
+    # must not do.
+    body = b"".join([chunk async for chunk in response.body_iterator])
+    digest = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    etag = f"W/{digest}"
+
+    # If-None-Match uses weak comparison, so W/ is ignored on both sides
+    if_none_match = request.headers.get("if-none-match", "")
+    client_etags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    if digest in client_etags or "*" in client_etags:
+        # A 304 must repeat some headers of the full response (e.g. Vary, Cache-Control)
+        not_modified = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+        not_modified.raw_headers = [
+            (name, value)
+            for name, value in response.headers.raw
+            if name in NOT_MODIFIED_HEADERS
+        ]
+        not_modified.headers["ETag"] = etag
+        # GZipMiddleware runs outside this one and only adds Vary to bodies it
+        # compresses, so add it here for the (empty) 304 as well
+        if "vary" not in not_modified.headers:
+            not_modified.headers["Vary"] = "Accept-Encoding"
+        return not_modified
+
+    # Same body and headers as before, plus the ETag.
+    # Copy the raw header list so repeated headers (e.g. Set-Cookie) are kept.
+    new_response = Response(content=body, status_code=response.status_code)
+    new_response.raw_headers = list(response.headers.raw)
+    new_response.headers["ETag"] = etag
+    return new_response
+
+
+# Compress bigger responses (e.g. user lists) when the client accepts gzip.
+# Small responses are sent as they are, where compressing would not pay off.
+# Added after the ETag middleware so it runs outside it: the (weak) ETag is
+# taken from the uncompressed body, which stays the same between requests
+# (gzip output includes a timestamp, so it does not).
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
 # These are the addresses for Workout service and Goals service.
 # If they are not set, we default to localhost ports for running locally.
 WORKOUT_SERVICE_BASE_URL = os.getenv("WORKOUT_SERVICE_BASE_URL", "http://localhost:8001")
 GOALS_SERVICE_BASE_URL = os.getenv("GOALS_SERVICE_BASE_URL", "http://localhost:8002")
 
-def commit_or_rollback(db: Session, error_msg: str):
-    # This tries to commit changes to the DB.
+# Full endpoint URLs, built once here instead of on every request
+WORKOUTS_URL = f"{WORKOUT_SERVICE_BASE_URL}/workouts"
+GOALS_URL = f"{GOALS_SERVICE_BASE_URL}/goals"
+
+async def write_or_rollback(db: AsyncSession, stmt, error_msg: str):
+    # Runs one write statement (with RETURNING) and commits it.
+    # Returns the returned row, or None if no row matched.
     try:
-        db.commit()
+        result = await db.execute(stmt)
+        row = result.scalar_one_or_none()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_409_CONFLICT,  
+            status_code=status.HTTP_409_CONFLICT,
             detail=error_msg,
         )
+    return row
+
+
+def read_downstream(res, service: str):
+    # res is either the response from another service,
+    # or the exception that was raised while calling it.
+    if isinstance(res, httpx.TimeoutException):
+        # The other service was too slow to answer
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail=f"Timed out contacting {service} service",
+        )
+    if isinstance(res, httpx.RequestError):
+        # Network problem: service down, refused connection, bad DNS, etc.
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"Error contacting {service} service: {res}",
+        )
+    if isinstance(res, BaseException):
+        raise res
+
+    try:
+        res.raise_for_status()
+    except httpx.HTTPStatusError as exc:
+        # The other service returned an error status
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail=f"{service.capitalize()} service error: {exc.response.text}",
+        )
+
+    return res.json()
+
+
+async def clear_users_cache():
+    # Called after every write, so cached reads never return old data
+    await FastAPICache.clear(namespace=USERS_CACHE_NAMESPACE)
 
 
 @app.get("/health")
@@ -66,24 +235,43 @@ def root():
     response_model=UserOutput,
     status_code=status.HTTP_201_CREATED,
 )
-def add_user(payload: UserInput, db: Session = Depends(get_db)):
-    # Create a user row from the request body
-    user = UserDB(**payload.model_dump())
-    db.add(user)
+async def add_user(payload: UserInput, db: AsyncSession = Depends(get_db)):
+    # Create a user row from the request body in one INSERT ... RETURNING,
+    # so the new user_id comes back without a second query
+    # (fields passed one by one, no intermediate dict from model_dump)
+    stmt = (
+        insert(UserDB)
+        .values(
+            name=payload.name,
+            email=payload.email,
+            age=payload.age,
+            gender=payload.gender,
+        )
+        .returning(UserDB)
+    )
 
     # Save to DB (or rollback if duplicate etc.)
-    commit_or_rollback(db, "User already exists")
-
-    db.refresh(user)
+    user = await write_or_rollback(db, stmt, "User already exists")
+    await clear_users_cache()
     return user
 
 
 # LIST users 
-@app.get("/api/users", response_model=list[UserOutput])
-def list_users(
-    limit: int = 10,   # how many users to return
-    offset: int = 0,   # how many to skip 
-    db: Session = Depends(get_db),
+# No response_model here: the rows are turned into plain dicts and sent
+# to orjson (the default response class), skipping a Pydantic validation
+# pass for every row.
+# The tradeoff is that this output is not validated against UserOutput
+# (which is still listed below for the API docs).
+@app.get(
+    "/api/users",
+    response_model=None,
+    responses={200: {"model": list[UserOutput]}},
+)
+@cache(expire=CACHE_EXPIRE_SECONDS, namespace=USERS_CACHE_NAMESPACE)
+async def list_users(
+    limit: int = Query(10, ge=1, le=200),   # how many users to return (max 200)
+    offset: int = Query(0, ge=0),           # how many to skip 
+    db: AsyncSession = Depends(get_db),
 ):
     # Build a SQL query: ORDER BY user_id, then LIMIT/OFFSET
     stmt = (
@@ -94,97 +282,116 @@ def list_users(
     )
 
     # Run the query and return the list
-    result = db.execute(stmt)
-    return result.scalars().all()
+    result = await db.execute(stmt)
+    return [
+        {
+            "user_id": user.user_id,
+            "name": user.name,
+            "email": user.email,
+            "age": user.age,
+            "gender": user.gender.value,
+        }
+        for user in result.scalars()
+    ]
 
 
 # GET one user by ID
 @app.get("/api/users/{user_id}", response_model=UserOutput)
-def get_user(user_id: int, db: Session = Depends(get_db)):
+@cache(expire=CACHE_EXPIRE_SECONDS, namespace=USERS_CACHE_NAMESPACE)
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)) -> UserOutput:
     # db.get finds by primary key
-    user = db.get(UserDB, user_id)
+    user = await db.get(UserDB, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-    return user
+    return UserOutput.model_validate(user)
 
 @app.put("/api/users/{user_id}", response_model=UserOutput)
-def replace_user(
+async def replace_user(
     user_id: int,
     payload: UserInput,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    # Find the user first
-    user = db.get(UserDB, user_id)
+    # Replace ALL fields (PUT is “full update”) in one UPDATE ... RETURNING
+    stmt = (
+        update(UserDB)
+        .where(UserDB.user_id == user_id)
+        .values(
+            name=payload.name,
+            email=payload.email,
+            age=payload.age,
+            gender=payload.gender,
+        )
+        .returning(UserDB)
+    )
+
+    # Save changes (no row back means the user does not exist)
+    user = await write_or_rollback(db, stmt, "User update failed")
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-
-    # Replace ALL fields (PUT is “full update”)
-    user.name = payload.name
-    user.email = payload.email
-    user.age = payload.age
-    user.gender = payload.gender
-
-    # Save changes 
-    commit_or_rollback(db, "User update failed")
-    db.refresh(user)
+    await clear_users_cache()
     return user
 
 
 # PARTIAL UPDATE user 
 @app.patch("/api/users/{user_id}", response_model=UserOutput)
-def update_user(
+async def update_user(
     user_id: int,
     payload: UserUpdate,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    # Find the user first
-    user = db.get(UserDB, user_id)
+    # Only pull the fields the user actually sent
+    # (model_fields_set, which is cheaper than model_dump(exclude_unset=True))
+    data = {field: getattr(payload, field) for field in payload.model_fields_set}
+
+    if data:
+        # Update those fields only, in one UPDATE ... RETURNING
+        stmt = (
+            update(UserDB)
+            .where(UserDB.user_id == user_id)
+            .values(**data)
+            .returning(UserDB)
+        )
+        user = await write_or_rollback(db, stmt, "User update failed")
+    else:
+        # Nothing to change, just return the user as it is
+        user = await db.get(UserDB, user_id)
+
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-
-    # Only pull the fields the user actually sent (exclude_unset=True)
-    data = payload.model_dump(exclude_unset=True)
-
-    # Update those fields only
-    for field, value in data.items():
-        setattr(user, field, value)
-
-    # Save changes
-    commit_or_rollback(db, "User update failed")
-    db.refresh(user)
+    if data:
+        # Only clear the cache when something was actually written
+        await clear_users_cache()
     return user
 
 
 # DELETE user
 @app.delete("/api/users/{user_id}", status_code=status.HTTP_204_NO_CONTENT)
-def delete_user(user_id: int, db: Session = Depends(get_db)) -> Response:
-    # Find the user first
-    user = db.get(UserDB, user_id)
-    if not user:
+async def delete_user(user_id: int, db: AsyncSession = Depends(get_db)) -> Response:
+    # Delete in one statement (no row back means the user does not exist)
+    stmt = delete(UserDB).where(UserDB.user_id == user_id).returning(UserDB.user_id)
+    deleted_id = await write_or_rollback(db, stmt, "User delete failed")
+    if deleted_id is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
-
-    # Delete from DB
-    db.delete(user)
-    db.commit()
+    await clear_users_cache()
 
     return Response(status_code=status.HTTP_204_NO_CONTENT)
 
 # These endpoints let the Users service call the Workout service and Goals service.
 # It shows the pattern of one service calling another service.
 @app.get("/api/proxy/workouts/{user_id}", tags=["proxy"])
-def proxy_workouts(user_id: int, db: Session = Depends(get_db)):
+async def proxy_workouts(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
     """
     Proxy endpoint:
     - Check user exists in Users DB
@@ -192,25 +399,28 @@ def proxy_workouts(user_id: int, db: Session = Depends(get_db)):
     - Return the workout service response
     """
     # First, make sure user exists
-    user = db.get(UserDB, user_id)
+    user = await db.get(UserDB, user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found",
         )
 
-    # Build the URL to call Workout service
-    url = f"{WORKOUT_SERVICE_BASE_URL}/workouts"
-
     try:
         # Call workout service with user_id as query param
-        with httpx.Client() as client:
-            res = client.get(url, params={"user_id": user_id})
+        res = await request.app.state.ahttp.get(WORKOUTS_URL, params={"user_id": user_id})
 
         res.raise_for_status()
 
+    except httpx.TimeoutException:
+        # Workout service was too slow to answer
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Timed out contacting workout service",
+        )
+
     except httpx.RequestError as exc:
-        # Network problem: service down, timeout, bad DNS, etc.
+        # Network problem: service down, refused connection, bad DNS, etc.
         raise HTTPException(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=f"Error contacting workout service: {exc}",
@@ -227,4 +437,37 @@ def proxy_workouts(user_id: int, db: Session = Depends(get_db)):
     return {
         "from": "user_service",
         "workouts": res.json(),
-    }
\ No newline at end of file
+    }
+
+
+# SUMMARY for one user: user details + workouts + goals
+@app.get("/api/users/{user_id}/summary", tags=["proxy"])
+async def user_summary(user_id: int, request: Request, db: AsyncSession = Depends(get_db)):
+    """
+    Aggregate endpoint:
+    - Check user exists in Users DB
+    - Call Workout service and Goals service at the same time
+    - Return the user together with their workouts and goals
+    """
+    # First, make sure user exists
+    user = await db.get(UserDB, user_id)
+    if not user:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found",
+        )
+
+    # Fire both requests together, so we wait for the slowest one
+    # instead of the two of them added up
+    client = request.app.state.ahttp
+    workout_task = client.get(WORKOUTS_URL, params={"user_id": user_id})
+    goals_task = client.get(GOALS_URL, params={"user_id": user_id})
+    workout_res, goals_res = await asyncio.gather(
+        workout_task, goals_task, return_exceptions=True
+    )
+
+    return {
+        "user": UserOutput.model_validate(user),
+        "workouts": read_downstream(workout_res, "workout"),
+        "goals": read_downstream(goals_res, "goals"),
+    }
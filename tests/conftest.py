@@ -1,7 +1,36 @@
 #tests/conftest.py
+import asyncio
+import uuid
+
+import httpx
 from fastapi.testclient import TestClient
 from app.main import app
 import pytest
 @pytest.fixture
 def client():
- return TestClient(app)
\ No newline at end of file
+ # "with" runs the app lifespan (DB setup, HTTP clients, cache)
+ with TestClient(app) as c:
+  yield c
+
+@pytest.fixture
+def create_user(client):
+ # Creates a user with a unique email and returns it (as JSON)
+ def _create(name="Paul", age=25, gender="Male"):
+  email = f"user-{uuid.uuid4().hex[:8]}@atu.ie"
+  payload = {"name": name, "email": email, "age": age, "gender": gender}
+  return client.post("/api/users", json=payload).json()
+ return _create
+
+@pytest.fixture
+def fake_services(client, monkeypatch):
+ # Replaces the shared HTTP client with one that sends every request to
+ # `handler` instead of the real Workout/Goals services
+ fakes = []
+ def _install(handler):
+  fake = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+  monkeypatch.setattr(app.state, "ahttp", fake, raising=False)
+  fakes.append(fake)
+  return fake
+ yield _install
+ for fake in fakes:
+  asyncio.run(fake.aclose())
@@ -1,5 +1,10 @@
 # tests/test_users.py
+import asyncio
+
+import httpx
 import pytest
+
+from app.main import BoundedInMemoryBackend
 def user_payload(uid=1, name="Paul", email="pl@atu.ie", age=25, gender="Male"):
     return {"user_id": uid, "name": name, "email": email, "age": age, "gender": gender}
 
@@ -21,6 +26,112 @@ def test_bad_gender_422(client, bad_gender):
     r = client.post("/api/users", json=user_payload(uid=3, gender=bad_gender))
     assert r.status_code == 422 # pydantic validation error
 
+def test_etag_304_when_unchanged(client):
+    r1 = client.get("/health")
+    assert r1.status_code == 200
+    etag = r1.headers["etag"]
+
+    r2 = client.get("/health", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.content == b""
+    assert r2.headers["etag"] == etag
+
+def test_etag_304_on_get_user(client, create_user):
+    uid = create_user()["user_id"]
+
+    r1 = client.get(f"/api/users/{uid}")
+    assert r1.status_code == 200
+    etag = r1.headers["etag"]
+
+    r2 = client.get(f"/api/users/{uid}", headers={"If-None-Match": etag})
+    assert r2.status_code == 304
+    assert r2.content == b""
+    assert r2.headers["etag"] == etag
+    assert "cache-control" in r2.headers
+
+def test_get_user_cached_then_cleared_on_update(client, create_user):
+    uid = create_user()["user_id"]
+
+    assert client.get(f"/api/users/{uid}").headers["x-fastapi-cache"] == "MISS"
+    assert client.get(f"/api/users/{uid}").headers["x-fastapi-cache"] == "HIT"
+
+    # An empty PATCH writes nothing, so the cached copy stays
+    client.patch(f"/api/users/{uid}", json={})
+    assert client.get(f"/api/users/{uid}").headers["x-fastapi-cache"] == "HIT"
+
+    client.patch(f"/api/users/{uid}", json={"name": "Changed"})
+    r = client.get(f"/api/users/{uid}")
+    assert r.headers["x-fastapi-cache"] == "MISS"
+    assert r.json()["name"] == "Changed"
+
+def test_cache_key_ignores_unknown_params(client, create_user):
+    uid = create_user()["user_id"]
+
+    assert client.get(f"/api/users/{uid}").headers["x-fastapi-cache"] == "MISS"
+    r = client.get(f"/api/users/{uid}", params={"junk": "1"})
+    assert r.headers["x-fastapi-cache"] == "HIT"
+
+def test_cache_backend_drops_least_recently_used():
+    async def run():
+        backend = BoundedInMemoryBackend(max_size=2)
+        await backend.set("a", b"1", 30)
+        await backend.set("b", b"2", 30)
+        await backend.get("a")            # "b" is now the oldest
+        await backend.set("c", b"3", 30)
+        return [await backend.get(key) for key in ("a", "b", "c")]
+
+    assert asyncio.run(run()) == [b"1", None, b"3"]
+
+def test_list_users_cached_then_cleared_on_create(client, create_user):
+    create_user()
+
+    r1 = client.get("/api/users", params={"limit": 200})
+    assert r1.headers["x-fastapi-cache"] == "MISS"
+    assert "cache-control" in r1.headers
+    r2 = client.get("/api/users", params={"limit": 200})
+    assert r2.headers["x-fastapi-cache"] == "HIT"
+    assert r2.json() == r1.json()
+
+    create_user()
+    assert client.get("/api/users", params={"limit": 200}).headers["x-fastapi-cache"] == "MISS"
+
+@pytest.mark.parametrize("params", [{"limit": 0}, {"limit": 1000}, {"offset": -1}])
+def test_list_users_bad_paging_422(client, params):
+    r = client.get("/api/users", params=params)
+    assert r.status_code == 422
+
+def test_gzip_large_response_only(client):
+    # openapi.json is well over the 1 KB threshold, /health is tiny
+    r = client.get("/openapi.json", headers={"Accept-Encoding": "gzip"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert "paths" in r.json()
+
+    r = client.get("/health", headers={"Accept-Encoding": "gzip"})
+    assert "content-encoding" not in r.headers
+
+def test_gzip_response_still_gets_304(client, create_user):
+    # Enough users to push the list over the 1 KB gzip threshold
+    for _ in range(15):
+        create_user()
+
+    r1 = client.get("/api/users", params={"limit": 50}, headers={"Accept-Encoding": "gzip"})
+    assert r1.headers["content-encoding"] == "gzip"
+    etag = r1.headers["etag"]
+    # Weak, because the plain (not gzipped) response gets the same ETag
+    assert etag.startswith('W/"')
+    plain = client.get("/api/users", params={"limit": 50}, headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in plain.headers
+    assert plain.headers["etag"] == etag
+
+    r2 = client.get(
+        "/api/users",
+        params={"limit": 50},
+        headers={"Accept-Encoding": "gzip", "If-None-Match": etag},
+    )
+    assert r2.status_code == 304
+    assert r2.headers["etag"] == etag
+    assert r2.headers["vary"] == "Accept-Encoding"
+
 def test_get_user_404(client):
     r = client.get("/api/users/999")
     assert r.status_code == 404
@@ -59,4 +170,55 @@ def test_put_user_404(client):
     " " ]) 
 def test_user_bad_email_422(client, bad_email):
     r = client.post("/api/users", json=user_payload(uid=10, email=bad_email))
-    assert r.status_code == 422
\ No newline at end of file
+    assert r.status_code == 422
+
+def test_user_summary_ok(client, create_user, fake_services):
+    user = create_user()
+    uid = user["user_id"]
+
+    # Fake Workout and Goals services
+    def handler(request):
+        if request.url.path == "/workouts":
+            return httpx.Response(200, json=[{"id": 1, "user_id": uid}])
+        return httpx.Response(200, json=[{"id": 7, "user_id": uid}])
+
+    fake_services(handler)
+
+    r = client.get(f"/api/users/{uid}/summary")
+    assert r.status_code == 200
+    body = r.json()
+    assert body["user"] == user
+    assert body["workouts"] == [{"id": 1, "user_id": uid}]
+    assert body["goals"] == [{"id": 7, "user_id": uid}]
+
+def test_user_summary_timeout_504(client, create_user, fake_services):
+    uid = create_user()["user_id"]
+
+    # Workout service is too slow, Goals service answers
+    def handler(request):
+        if request.url.path == "/workouts":
+            raise httpx.ReadTimeout("too slow", request=request)
+        return httpx.Response(200, json=[])
+
+    fake_services(handler)
+
+    r = client.get(f"/api/users/{uid}/summary")
+    assert r.status_code == 504
+    assert "workout" in r.json()["detail"].lower()
+
+def test_proxy_workouts_timeout_504(client, create_user, fake_services):
+    uid = create_user()["user_id"]
+
+    # Workout service is too slow
+    def handler(request):
+        raise httpx.ReadTimeout("too slow", request=request)
+
+    fake_services(handler)
+
+    r = client.get(f"/api/proxy/workouts/{uid}")
+    assert r.status_code == 504
+    assert "workout" in r.json()["detail"].lower()
+
+def test_user_summary_404(client):
+    r = client.get("/api/users/999/summary")
+    assert r.status_code == 404